@@ -1,65 +1,67 @@
 import sys
 import os
-import re
-import unicodedata
 import shutil
+import argparse
+import heapq
+import threading
 from collections import defaultdict
+from itertools import groupby
+from operator import itemgetter
+from concurrent.futures import Future
 from PyQt5.QtWidgets import (
     QApplication, QWidget, QVBoxLayout, QHBoxLayout, QPushButton,
     QTreeWidget, QTreeWidgetItem, QMessageBox, QLabel,
-    QFileDialog, QDialog, QComboBox, QDialogButtonBox, QLineEdit
+    QFileDialog, QDialog, QComboBox, QDialogButtonBox, QLineEdit, QCheckBox
 )
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QSettings, pyqtSignal
 from PyQt5.QtGui import QFont, QColor, QPalette
 from PyQt5.QtWidgets import QHeaderView
+from reference_index import abrir_indice, atualizar_indice, editar_ocorrencias
 
 
-def remover_acentos(texto):
+# Serializa as varreduras em segundo plano, que compartilham o mesmo índice
+_SCAN_LOCK = threading.Lock()
+
+
+def executar_em_segundo_plano(funcao, *args):
     """
-    Remove acentos de uma string e normaliza para minúsculas.
+    Executa funcao em uma thread daemon, uma por vez, enquanto a interface é construída.
+    Threads daemon não seguram o encerramento do processo, então fechar o aplicativo
+    durante uma varredura longa não espera o fim dela.
+    :return: Future com o resultado de funcao.
     """
-    nfkd = unicodedata.normalize('NFKD', texto)
-    return ''.join([c for c in nfkd if not unicodedata.combining(c)]).lower().strip()
+    future = Future()
+
+    def executar():
+        with _SCAN_LOCK:
+            if not future.set_running_or_notify_cancel():
+                return
+            try:
+                resultado = funcao(*args)
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(resultado)
+
+    threading.Thread(target=executar, daemon=True).start()
+    return future
 
 
-def extrair_referencias(linha):
+def iniciar_varredura(directory, db_path=None):
     """
-    Extrai todas as referências dentro de colchetes duplos em uma linha.
-    Retorna uma lista de tuplas (exact_ref, normalized_ref).
+    Inicia a indexação do diretório em segundo plano.
+    :param db_path: Banco SQLite usado como índice; sem ele, o índice fica em memória.
+    :return: Future cujo resultado é o índice (ver reference_index.abrir_indice).
     """
-    matches = re.findall(r'\[\[(.*?)\]\]', linha)
-    referencias = []
-    for match in matches:
-        exact_ref = match.strip()
-        normalized_ref = remover_acentos(match)
-        if exact_ref:
-            referencias.append((exact_ref, normalized_ref))
-    return referencias
+    return executar_em_segundo_plano(abrir_indice, directory, db_path)
 
 
-def agrupar_por_palavras_comuns(referencias):
+def iniciar_reindexacao(indice, arquivos=None):
     """
-    Agrupa referências por palavras em comum, sem ignorar stopwords.
-    :param referencias: Dicionário {arquivo: [(linha, exact_text)]}.
-    :return: Dicionário {palavra_comum: [(arquivo, linha, exact_text)]}.
+    Relê em segundo plano os arquivos informados de um índice existente.
+    :return: Future cujo resultado é o próprio índice.
     """
-    grupos = defaultdict(list)
-
-    for arquivo, ocorrencias in referencias.items():
-        for linha, exact_text in ocorrencias:
-            # Extrair todas as palavras (incluindo stopwords)
-            palavras = set(remover_acentos(exact_text).split())
-            for palavra in palavras:
-                grupos[palavra].append((arquivo, linha, exact_text))
-
-    # Filtrar grupos com textos distintos
-    grupos_filtrados = {
-        palavra: lista
-        for palavra, lista in grupos.items()
-        if len({oc[2] for oc in lista}) > 1  # Verifica se há textos diferentes
-    }
-
-    return grupos_filtrados
+    return executar_em_segundo_plano(atualizar_indice, indice, arquivos)
 
 
 # Dicionário de traduções para as duas línguas suportadas
@@ -91,6 +93,10 @@ LANGUAGES = {
         'close_confirmation_question': "Are you sure you want to quit?",
         'close_confirmation_yes': "Yes",
         'close_confirmation_no': "No",
+        'info_scanning': "Scanning {directory}...",
+        'checkbox_aggregate': "Collapse identical texts",
+        'aggregated_files': "{count} file(s)",
+        'load_more': "Load more... ({count} shown)",
     },
     'portuguese': {
         'window_title': "Gerenciador de Referências de Markdown",
@@ -119,6 +125,10 @@ LANGUAGES = {
         'close_confirmation_question': "Tem certeza de que deseja sair?",
         'close_confirmation_yes': "Sim",
         'close_confirmation_no': "Não",
+        'info_scanning': "Analisando {directory}...",
+        'checkbox_aggregate': "Agrupar textos idênticos",
+        'aggregated_files': "{count} arquivo(s)",
+        'load_more': "Carregar mais... ({count} exibidos)",
     }
 }
 
@@ -127,12 +137,12 @@ class LanguageSelectionDialog(QDialog):
     """
     Dialog para selecionar o idioma do aplicativo no início.
     """
-    def __init__(self, translations, parent=None):
+    def __init__(self, translations, parent=None, selected_language='english'):
         super().__init__(parent)
         self.translations = translations
         self.setWindowTitle(self.translations['language_selection_title'])
         self.setModal(True)
-        self.selected_language = 'english'  # Padrão
+        self.selected_language = selected_language  # Padrão
         self.initUI()
 
     def initUI(self):
@@ -147,7 +157,7 @@ class LanguageSelectionDialog(QDialog):
         self.combo_languages = QComboBox()
         self.combo_languages.addItem(self.translations['language_english'], 'english')
         self.combo_languages.addItem(self.translations['language_portuguese'], 'portuguese')
-        self.combo_languages.setCurrentIndex(0)  # Padrão para inglês
+        self.combo_languages.setCurrentIndex(max(0, self.combo_languages.findData(self.selected_language)))
         layout.addWidget(self.combo_languages)
 
         # Botões OK e Cancelar
@@ -201,16 +211,39 @@ class NameSuggestionDialog(QDialog):
         return self.input_new_name.text().strip()
 
 
+# Papéis de dados dos itens da árvore
+ROLE_WORD = Qt.UserRole               # Palavra comum do grupo (grupos e textos agregados)
+ROLE_TEXT = Qt.UserRole + 1           # Texto exato (textos agregados)
+ROLE_POPULATED = Qt.UserRole + 2      # Filhos já criados (preenchimento sob demanda)
+ROLE_MORE = Qt.UserRole + 3           # Offset da próxima página (item "Carregar mais")
+
+# Quantidade de itens buscados no índice por vez em cada nível da árvore
+TREE_PAGE_SIZE = 500
+
+
 class MarkdownReferenceManager(QWidget):
-    def __init__(self, translations):
+    # Emitido quando a varredura em segundo plano termina (recebe o Future)
+    scan_finished = pyqtSignal(object)
+
+    def __init__(self, translations, settings=None, directory=None, scan_future=None, db_path=None):
         super().__init__()
         self.translations = translations
+        self.settings = settings if settings is not None else carregar_configuracoes()
         self.setWindowTitle(self.translations['window_title'])
         self.setGeometry(100, 100, 1200, 800)  # Ajustado para melhor visualização
+        geometry = self.settings.value('window/geometry')
+        if geometry is not None:
+            self.restoreGeometry(geometry)
         self.action_history = []  # Histórico para funcionalidade de desfazer
-        self.initUI()
-
-    def initUI(self):
+        self.directory = None
+        self.db_path = db_path
+        self.index = None
+        self._scan_future = None
+        # Conexão enfileirada: o resultado só é aplicado quando o loop de eventos estiver rodando
+        self.scan_finished.connect(self.on_scan_finished, Qt.QueuedConnection)
+        self.initUI(directory, scan_future)
+
+    def initUI(self, directory=None, scan_future=None):
         # Aplicar tema escuro
         self.apply_dark_theme()
 
@@ -235,15 +268,31 @@ class MarkdownReferenceManager(QWidget):
         self.tree.setSelectionBehavior(QTreeWidget.SelectRows)     # Seleção por linha
         self.tree.setAlternatingRowColors(True)
         self.tree.setRootIsDecorated(False)  # Sem setas de expansão
-
-        # Ajustar cabeçalhos para ajustar ao conteúdo
-        self.tree.header().setSectionResizeMode(QHeaderView.ResizeToContents)
+        # Filhos são criados apenas quando o item é expandido
+        self.tree.itemExpanded.connect(self.populate_item)
+        self.tree.itemActivated.connect(self.load_more)
+
+        # Restaurar larguras salvas; sem perfil, ajustar cabeçalhos ao conteúdo
+        column_widths = self.settings.value('tree/column_widths')
+        if column_widths:
+            self.tree.header().setSectionResizeMode(QHeaderView.Interactive)
+            for column, width in enumerate(column_widths[:self.tree.columnCount()]):
+                self.tree.setColumnWidth(column, int(width))
+        else:
+            self.tree.header().setSectionResizeMode(QHeaderView.ResizeToContents)
 
         # Remover conexão de seleção personalizada
         # self.tree.itemClicked.connect(self.handle_item_clicked)  # Removido para usar seleção nativa
 
         layout.addWidget(self.tree)
 
+        # Modo agregado: um item por texto exato, com contagem de ocorrências e arquivos
+        self.chk_aggregate = QCheckBox(self.translations['checkbox_aggregate'])
+        self.chk_aggregate.setStyleSheet("color: white;")
+        self.chk_aggregate.setChecked(self.settings.value('tree/aggregate', False, type=bool))
+        self.chk_aggregate.toggled.connect(self.toggle_aggregate)
+        layout.addWidget(self.chk_aggregate)
+
         # Botões de ação
         button_layout = QHBoxLayout()
 
@@ -323,7 +372,7 @@ class MarkdownReferenceManager(QWidget):
         self.setLayout(layout)
 
         # Carregar e analisar arquivos
-        self.load_and_analyze_files()
+        self.load_and_analyze_files(directory, scan_future)
 
     def apply_dark_theme(self):
         """
@@ -351,95 +400,270 @@ class MarkdownReferenceManager(QWidget):
         QApplication.instance().setPalette(dark_palette)
         QApplication.instance().setStyle("Fusion")
 
-    def load_and_analyze_files(self):
+    def load_and_analyze_files(self, directory=None, scan_future=None):
         """
-        Solicita ao usuário que selecione um diretório e analisa os arquivos .md nele.
+        Analisa os arquivos .md do diretório informado. Sem diretório, solicita ao usuário
+        que selecione um. A varredura roda em segundo plano e a árvore é preenchida em
+        on_scan_finished; scan_future permite reaproveitar uma varredura já iniciada.
         """
-        # Abrir diálogo para selecionar diretório
-        if self.translations['language_english'] == "English":
-            directory = QFileDialog.getExistingDirectory(self, "Select folder with .md files")
-        else:
-            directory = QFileDialog.getExistingDirectory(self, "Selecione a pasta com arquivos .md")
-
         if not directory:
-            QMessageBox.warning(
-                self,
-                "Warning" if self.translations['language_english'] == "English" else "Aviso",
-                self.translations['error_no_files_selected']
-            )
-            sys.exit()
-
-        # Listar todos os arquivos .md no diretório
-        md_files = [f for f in os.listdir(directory) if f.lower().endswith('.md')]
-
-        if not md_files:
-            QMessageBox.warning(
-                self,
-                "Warning" if self.translations['language_english'] == "English" else "Aviso",
-                self.translations['info_no_common_words']
-            )
-            sys.exit()
-
-        # Analisar referências em todos os arquivos
-        self.references = defaultdict(list)  # {arquivo: [(linha, exact_text)]}
+            # Abrir diálogo para selecionar diretório
+            if self.translations['language_english'] == "English":
+                directory = QFileDialog.getExistingDirectory(self, "Select folder with .md files")
+            else:
+                directory = QFileDialog.getExistingDirectory(self, "Selecione a pasta com arquivos .md")
 
-        for file in md_files:
-            file_path = os.path.join(directory, file)
-            try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    for line_num, line in enumerate(f, start=1):
-                        referencias = extrair_referencias(line)
-                        for exact_ref, normalized_ref in referencias:
-                            self.references[file].append((line_num, exact_ref))
-            except Exception as e:
-                QMessageBox.critical(
+            if not directory:
+                QMessageBox.warning(
                     self,
-                    "Error" if self.translations['language_english'] == "English" else "Erro",
-                    self.translations['error_merge_failed'].format(error=str(e))
+                    "Warning" if self.translations['language_english'] == "English" else "Aviso",
+                    self.translations['error_no_files_selected']
                 )
                 sys.exit()
 
-        # Agrupar referências por palavras em comum
-        grupos_filtrados = agrupar_por_palavras_comuns(self.references)
+        self.directory = directory
+
+        if scan_future is None:
+            scan_future = iniciar_varredura(directory, self.db_path)
+        self._scan_future = scan_future
+        # A varredura pode estar reescrevendo o índice: sem consultas até ela terminar
+        self.chk_aggregate.setEnabled(False)
+        self.feedback.setText(self.translations['info_scanning'].format(directory=directory))
+        scan_future.add_done_callback(self.scan_finished.emit)
+
+    def on_scan_finished(self, future):
+        """
+        Preenche o Tree Widget com o resultado da varredura em segundo plano.
+        """
+        # Ignorar varreduras substituídas por outra mais recente
+        if future is not self._scan_future:
+            return
+        self._scan_future = None
+        self.feedback.setText("")
+        self.chk_aggregate.setEnabled(True)
+
+        try:
+            index = future.result()
+        except Exception as e:
+            # Não reabrir automaticamente uma pasta que não pôde ser lida
+            self.settings.remove('vault/last_directory')
+            QMessageBox.critical(
+                self,
+                "Error" if self.translations['language_english'] == "English" else "Erro",
+                self.translations['error_merge_failed'].format(error=str(e))
+            )
+            QApplication.instance().exit()
+            return
+
+        if self.index is not None and self.index is not index:
+            self.index.fechar()
+        self.index = index
 
-        if not grupos_filtrados:
+        if not index.contar_grupos():
+            self.settings.remove('vault/last_directory')
             QMessageBox.information(
                 self,
                 "Information" if self.translations['language_english'] == "English" else "Informação",
                 self.translations['info_no_common_words']
             )
-            sys.exit()
+            QApplication.instance().exit()
+            return
+
+        # Só lembrar a pasta depois de uma varredura bem-sucedida
+        self.settings.setValue('vault/last_directory', self.directory)
+        self.populate_tree()
 
-        # Ordenar grupos por frequência (decrescente)
-        sorted_groups = sorted(grupos_filtrados.items(), key=lambda x: len(x[1]), reverse=True)
+    def index_ready(self):
+        """
+        Indica se o índice pode ser consultado (existe e nenhuma varredura o está alterando).
+        """
+        return self.index is not None and self._scan_future is None
 
-        # Preencher o Tree Widget
-        for palavra, ocorrencias in sorted_groups:
-            # Cada grupo é baseado em uma palavra comum
-            freq = len(ocorrencias)
-            # Para exibir referências distintas, coletar textos únicos
-            refs_unicos = set([oc[2] for oc in ocorrencias])
-            ref_combined = ", ".join(refs_unicos)
+    def populate_tree(self):
+        """
+        Preenche o Tree Widget com a primeira página de grupos. As ocorrências de cada
+        grupo só viram itens quando o grupo é expandido (ver populate_item).
+        """
+        self.tree.clear()
+        self.load_page(None, 0)
 
-            group_item = QTreeWidgetItem([str(freq), palavra, "", "", ""])
-            group_item.setFont(1, QFont("Arial", 12, QFont.Bold))
-            group_item.setForeground(1, QColor(255, 255, 255))
-            group_item.setExpanded(False)  # Inicialmente colapsado
+    def populate_item(self, item):
+        """
+        Cria os filhos de um item na primeira vez em que ele é expandido.
+        """
+        if item.data(0, ROLE_POPULATED) or item.data(0, ROLE_WORD) is None:
+            return
+        item.setData(0, ROLE_POPULATED, True)
+        self.load_page(item, 0)
 
-            for oc in ocorrencias:
-                arquivo, linha, exact_text = oc
+    def load_more(self, item):
+        """
+        Substitui o item "Carregar mais" pela próxima página do mesmo nível.
+        """
+        offset = item.data(0, ROLE_MORE)
+        if offset is None:
+            return
+        parent = item.parent()
+        if parent is None:
+            self.tree.takeTopLevelItem(self.tree.indexOfTopLevelItem(item))
+        else:
+            parent.removeChild(item)
+        self.load_page(parent, offset)
+
+    def load_page(self, parent, offset):
+        """
+        Busca no índice uma página de filhos de parent (ou de grupos, se parent for None).
+        No modo agregado, os grupos listam cada texto exato uma única vez e as
+        linhas por arquivo só são criadas ao expandir o texto.
+        """
+        if not self.index_ready():
+            return
+        # Um item a mais indica se existe uma próxima página
+        limit = TREE_PAGE_SIZE + 1
+        items = []
+        if parent is None:
+            for palavra, freq in self.index.grupos(offset, limit):
+                # Cada grupo é baseado em uma palavra comum
+                group_item = QTreeWidgetItem([str(freq), palavra, "", "", ""])
+                group_item.setFont(1, QFont("Arial", 12, QFont.Bold))
+                group_item.setForeground(1, QColor(255, 255, 255))
+                group_item.setData(0, ROLE_WORD, palavra)
+                group_item.setChildIndicatorPolicy(QTreeWidgetItem.ShowIndicator)
+                items.append(group_item)
+        elif parent.parent() is None and self.chk_aggregate.isChecked():
+            palavra = parent.data(0, ROLE_WORD)
+            for exact_text, num_ocorrencias, num_arquivos in self.index.textos(palavra, offset, limit):
+                text_item = QTreeWidgetItem([
+                    str(num_ocorrencias), "",
+                    self.translations['aggregated_files'].format(count=num_arquivos),
+                    "", exact_text
+                ])
+                text_item.setData(0, ROLE_WORD, palavra)
+                text_item.setData(0, ROLE_TEXT, exact_text)
+                text_item.setChildIndicatorPolicy(QTreeWidgetItem.ShowIndicator)
+                items.append(text_item)
+        else:
+            ocorrencias = self.index.ocorrencias(
+                parent.data(0, ROLE_WORD), parent.data(0, ROLE_TEXT), offset, limit
+            )
+            for arquivo, linha, exact_text in ocorrencias:
                 occurrence_item = QTreeWidgetItem(["", "", arquivo, str(linha), exact_text])
                 # Remover checkboxes para utilizar seleção múltipla padrão
                 occurrence_item.setFlags(occurrence_item.flags() | Qt.ItemIsSelectable | Qt.ItemIsEnabled)
-                group_item.addChild(occurrence_item)
+                occurrence_item.setChildIndicatorPolicy(QTreeWidgetItem.DontShowIndicator)
+                items.append(occurrence_item)
+
+        if len(items) > TREE_PAGE_SIZE:
+            items = items[:TREE_PAGE_SIZE]
+            more_item = QTreeWidgetItem(["", self.translations['load_more'].format(count=offset + len(items)), "", "", ""])
+            more_item.setData(0, ROLE_MORE, offset + len(items))
+            more_item.setFlags(Qt.ItemIsEnabled)
+            more_item.setForeground(1, QColor(42, 130, 218))
+            items.append(more_item)
+
+        if parent is None:
+            self.tree.addTopLevelItems(items)
+        else:
+            parent.addChildren(items)
 
-            self.tree.addTopLevelItem(group_item)
+    def toggle_aggregate(self, checked):
+        """
+        Alterna entre o modo agregado e a lista completa de ocorrências.
+        """
+        self.settings.setValue('tree/aggregate', checked)
+        self.refresh_tree()
 
-        self.directory = directory
+    def refresh_tree(self):
+        """
+        Recarrega a árvore a partir do índice, mantendo os grupos expandidos.
+        """
+        if not self.index_ready():
+            return
+        expandidos = set()
+        for i in range(self.tree.topLevelItemCount()):
+            group_item = self.tree.topLevelItem(i)
+            if group_item.isExpanded():
+                expandidos.add(group_item.data(0, ROLE_WORD))
+
+        self.populate_tree()
+        for i in range(self.tree.topLevelItemCount()):
+            group_item = self.tree.topLevelItem(i)
+            if group_item.data(0, ROLE_WORD) in expandidos:
+                group_item.setExpanded(True)
+
+    def selected_targets(self):
+        """
+        Separa a seleção entre consultas ao índice e ocorrências avulsas.
+        :return: Tupla (alvos, avulsas): pares (palavra, exact_text ou None) dos grupos e
+                 textos agregados selecionados, e ocorrências [(arquivo, linha, exact_text)]
+                 das linhas selecionadas.
+        """
+        alvos = set()
+        avulsas = set()
+        for item in self.tree.selectedItems():
+            if item.data(0, ROLE_MORE) is not None:
+                continue
+            palavra = item.data(0, ROLE_WORD)
+            if palavra is not None:
+                alvos.add((palavra, item.data(0, ROLE_TEXT)))
+            else:
+                avulsas.add((item.text(2), int(item.text(3)), item.text(4)))
+        return sorted(alvos, key=str), sorted(avulsas)
+
+    def selected_occurrences_by_file(self):
+        """
+        Gera (arquivo, [(arquivo, linha, exact_text)]) para a seleção, um arquivo por vez.
+        Grupos e textos selecionados são lidos do índice aos poucos, sem carregar todas
+        as suas ocorrências, e cada arquivo aparece uma única vez.
+        """
+        alvos, avulsas = self.selected_targets()
+        por_arquivo = defaultdict(list)
+        for oc in avulsas:
+            por_arquivo[oc[0]].append(oc)
+
+        fontes = [self.index.ocorrencias_por_arquivo(palavra, exact_text) for palavra, exact_text in alvos]
+        fontes.append(sorted(por_arquivo.items()))
+        for arquivo, partes in groupby(heapq.merge(*fontes, key=itemgetter(0)), key=itemgetter(0)):
+            yield arquivo, [oc for _, lista in partes for oc in lista]
+
+    def edit_selected(self, replacement):
+        """
+        Apaga (replacement vazio) ou substitui as ocorrências selecionadas, arquivo por
+        arquivo, e depois relê os arquivos alterados no índice e recarrega a árvore.
+        :return: Textos exatos alterados, em ordem.
+        """
+        # Fazer backup dos arquivos originais
+        backup_dir = os.path.join(self.directory, ".backup_reference_manager")
+        os.makedirs(backup_dir, exist_ok=True)
+
+        arquivos = []
+        textos = set()
+        selecao = self.selected_occurrences_by_file()
+        try:
+            for arquivo, ocorrencias in selecao:
+                editar_ocorrencias(self.directory, ocorrencias, replacement, backup_dir)
+                arquivos.append(arquivo)
+                textos.update(oc[2] for oc in ocorrencias)
+        finally:
+            # Encerrar a leitura do índice antes de atualizá-lo
+            selecao.close()
+            self.tree.clearSelection()
+            self.index.indexar(arquivos)
+            self.refresh_tree()
+        return sorted(textos)
+
+    def group_of_item(self, item):
+        """
+        Retorna o item de grupo (palavra comum) ao qual um item pertence.
+        """
+        while item.parent() is not None:
+            item = item.parent()
+        return item
 
     def delete_references(self):
         """
-        Apaga as referências selecionadas de todas as ocorrências nos arquivos.
+        Apaga as referências selecionadas dos arquivos. Um grupo ou texto agregado
+        selecionado apaga todas as suas ocorrências de uma vez.
         """
         selected_items = self.tree.selectedItems()
 
@@ -451,55 +675,20 @@ class MarkdownReferenceManager(QWidget):
             )
             return
 
-        # Agrupar referências selecionadas por "Common Word" para deletar em lote
-        common_words = set()
-        for item in selected_items:
-            common_word = item.parent().text(1)
-            common_words.add(common_word)
-
-        # Fazer backup dos arquivos originais
-        backup_dir = os.path.join(self.directory, ".backup_reference_manager")
-        os.makedirs(backup_dir, exist_ok=True)
-
         try:
-            for ref in common_words:
-                # Encontrar todas as ocorrências desta referência
-                for i in range(self.tree.topLevelItemCount()):
-                    group_item = self.tree.topLevelItem(i)
-                    if group_item.text(1) == ref:
-                        # Iterar pelos itens filhos (ocorrências)
-                        for j in range(group_item.childCount()):
-                            occurrence_item = group_item.child(j)
-                            arquivo = occurrence_item.text(2)
-                            linha = int(occurrence_item.text(3))
-                            exact_text = occurrence_item.text(4)
-
-                            src = os.path.join(self.directory, arquivo)
-                            backup_path = os.path.join(backup_dir, arquivo)
-                            shutil.copy2(src, backup_path)  # Backup do arquivo
-
-                            # Ler o arquivo e remover a referência na linha específica
-                            with open(src, 'r', encoding='utf-8') as f:
-                                lines = f.readlines()
-
-                            if 0 < linha <= len(lines):
-                                # Remover a referência da linha
-                                pattern = re.escape(exact_text)
-                                lines[linha - 1] = re.sub(r'\[\[' + pattern + r'\]\]', '', lines[linha - 1], flags=re.IGNORECASE)
-                                with open(src, 'w', encoding='utf-8') as f:
-                                    f.writelines(lines)
-
-            # Atualizar o Tree Widget e o histórico
-            for ref in common_words:
-                self.action_history.append({
-                    'action': 'delete',
-                    'reference': ref,
-                    'backup_dir': backup_dir
-                })
-                self.remove_reference_from_tree(ref)
+            # Remover as referências, reescrevendo cada arquivo uma única vez
+            exact_texts = self.edit_selected('')
+
+            # Atualizar o histórico
+            backup_dir = os.path.join(self.directory, ".backup_reference_manager")
+            self.action_history.append({
+                'action': 'delete',
+                'references': exact_texts,
+                'backup_dir': backup_dir
+            })
 
             # Fornecer feedback
-            feedback_msg = self.translations['feedback_deleted'].format(files=", ".join(common_words))
+            feedback_msg = self.translations['feedback_deleted'].format(files=", ".join(exact_texts))
             self.feedback.setText(feedback_msg)
 
         except Exception as e:
@@ -525,7 +714,7 @@ class MarkdownReferenceManager(QWidget):
         # Agrupar referências selecionadas por "Common Word"
         common_words = set()
         for item in selected_items:
-            common_word = item.parent().text(1)
+            common_word = self.group_of_item(item).text(1)
             common_words.add(common_word)
 
         if len(common_words) > 1:
@@ -539,8 +728,6 @@ class MarkdownReferenceManager(QWidget):
             return
 
         common_word = common_words.pop()
-        # Obter todas as ocorrências selecionadas
-        selected_occurrences = [item for item in selected_items]
 
         # Dialog para inserir o novo nome da referência
         dialog = NameSuggestionDialog([common_word], self.translations, self)
@@ -554,41 +741,16 @@ class MarkdownReferenceManager(QWidget):
                 )
                 return
 
-            # Fazer backup dos arquivos originais
-            backup_dir = os.path.join(self.directory, ".backup_reference_manager")
-            os.makedirs(backup_dir, exist_ok=True)
-
             try:
-                for occurrence_item in selected_occurrences:
-                    arquivo = occurrence_item.text(2)
-                    linha = int(occurrence_item.text(3))
-                    exact_text = occurrence_item.text(4)
-
-                    src = os.path.join(self.directory, arquivo)
-                    backup_path = os.path.join(backup_dir, arquivo)
-                    shutil.copy2(src, backup_path)  # Backup do arquivo
-
-                    # Ler o arquivo e substituir a referência na linha específica
-                    with open(src, 'r', encoding='utf-8') as f:
-                        lines = f.readlines()
-
-                    if 0 < linha <= len(lines):
-                        # Substituir a referência na linha
-                        pattern = re.escape(exact_text)
-                        replacement = f'[[{new_ref}]]'
-                        lines[linha - 1] = re.sub(r'\[\[' + pattern + r'\]\]', replacement, lines[linha - 1], flags=re.IGNORECASE)
-                        with open(src, 'w', encoding='utf-8') as f:
-                            f.writelines(lines)
-
-                    # Atualizar o Tree Widget com o novo texto
-                    occurrence_item.setText(4, new_ref)
-                    # Desmarcar automaticamente a seleção após reescrever
-                    occurrence_item.setSelected(False)
+                # Substituir as referências (textos agregados incluem todas as suas ocorrências);
+                # a seleção é desmarcada e o Tree Widget recarregado com o novo texto
+                old_references = self.edit_selected(f'[[{new_ref}]]')
 
                 # Atualizar o histórico de ações
+                backup_dir = os.path.join(self.directory, ".backup_reference_manager")
                 self.action_history.append({
                     'action': 'rewrite',
-                    'old_references': [item.text(4) for item in selected_occurrences],
+                    'old_references': old_references,
                     'new_reference': new_ref,
                     'backup_dir': backup_dir
                 })
@@ -597,9 +759,6 @@ class MarkdownReferenceManager(QWidget):
                 feedback_msg = self.translations['feedback_merged'].format(filename=new_ref)
                 self.feedback.setText(feedback_msg)
 
-                # Desmarcar as seleções
-                self.tree.clearSelection()
-
             except Exception as e:
                 QMessageBox.critical(
                     self,
@@ -619,14 +778,19 @@ class MarkdownReferenceManager(QWidget):
             )
             return
 
+        if not self.index_ready():
+            # Outra varredura ainda usa o índice; desfazer depois que ela terminar
+            self.feedback.setText(self.translations['info_scanning'].format(directory=self.directory))
+            return
+
         last_action = self.action_history.pop()
 
         try:
             if last_action['action'] == 'delete':
-                ref = last_action['reference']
                 backup_dir = last_action['backup_dir']
                 # Restaurar referências a partir do backup
-                for file in os.listdir(backup_dir):
+                restored_files = os.listdir(backup_dir)
+                for file in restored_files:
                     src = os.path.join(backup_dir, file)
                     dest = os.path.join(self.directory, file)
                     shutil.copy2(src, dest)
@@ -635,9 +799,9 @@ class MarkdownReferenceManager(QWidget):
                 if not os.listdir(backup_dir):
                     os.rmdir(backup_dir)
 
-                # Recarregar e analisar arquivos
+                # Reindexar os arquivos restaurados na mesma pasta
                 self.tree.clear()
-                self.load_and_analyze_files()
+                self.load_and_analyze_files(self.directory, iniciar_reindexacao(self.index, restored_files))
 
                 # Fornecer feedback
                 action_text = "Delete" if self.translations['language_english'] == "English" else "Apagar"
@@ -650,7 +814,8 @@ class MarkdownReferenceManager(QWidget):
                 backup_dir = last_action['backup_dir']
 
                 # Restaurar referências originais a partir do backup
-                for file in os.listdir(backup_dir):
+                restored_files = os.listdir(backup_dir)
+                for file in restored_files:
                     src = os.path.join(backup_dir, file)
                     dest = os.path.join(self.directory, file)
                     shutil.copy2(src, dest)
@@ -659,9 +824,9 @@ class MarkdownReferenceManager(QWidget):
                 if not os.listdir(backup_dir):
                     os.rmdir(backup_dir)
 
-                # Recarregar e analisar arquivos
+                # Reindexar os arquivos restaurados na mesma pasta
                 self.tree.clear()
-                self.load_and_analyze_files()
+                self.load_and_analyze_files(self.directory, iniciar_reindexacao(self.index, restored_files))
 
                 # Fornecer feedback
                 action_text = "Rewrite" if self.translations['language_english'] == "English" else "Reescrever"
@@ -683,16 +848,6 @@ class MarkdownReferenceManager(QWidget):
                 self.translations['error_merge_failed'].format(error=str(e))
             )
 
-    def remove_reference_from_tree(self, ref):
-        """
-        Remove uma referência da Tree Widget.
-        """
-        for i in range(self.tree.topLevelItemCount()):
-            group_item = self.tree.topLevelItem(i)
-            if group_item.text(1) == ref:
-                self.tree.takeTopLevelItem(i)
-                break
-
     def update_reference_in_tree(self, old_ref, new_ref):
         """
         Atualiza o nome de uma referência na Tree Widget após reescrever.
@@ -703,6 +858,32 @@ class MarkdownReferenceManager(QWidget):
                 group_item.setText(1, new_ref)
                 break
 
+    def save_settings(self):
+        """
+        Salva o layout da janela e das colunas no perfil do usuário.
+        """
+        self.settings.setValue('window/geometry', self.saveGeometry())
+        self.settings.setValue(
+            'tree/column_widths',
+            [self.tree.columnWidth(column) for column in range(self.tree.columnCount())]
+        )
+        self.settings.sync()
+
+    def close_index(self):
+        """
+        Fecha o índice sem interromper uma varredura em segundo plano que ainda o use.
+        """
+        index, future = self.index, self._scan_future
+        self.index = None
+        self._scan_future = None
+        if index is None:
+            return
+        if future is not None and not future.cancel():
+            # A varredura em andamento compartilha a conexão: fechar quando ela terminar
+            future.add_done_callback(lambda f: index.fechar())
+        else:
+            index.fechar()
+
     def closeEvent(self, event):
         """
         Sobrescreve o evento de fechamento para garantir que todas as alterações sejam salvas ou tratadas.
@@ -727,30 +908,78 @@ class MarkdownReferenceManager(QWidget):
         )
 
         if reply == QMessageBox.Yes:
+            self.save_settings()
+            self.close_index()
             event.accept()
         else:
             event.ignore()
 
 
+# Perfil de configurações persistido entre execuções (idioma, última pasta, layout)
+SETTINGS_ORGANIZATION = "MarkdownReferenceManager"
+SETTINGS_APPLICATION = "MarkdownReferenceManager"
+
+
+def carregar_configuracoes():
+    """
+    Retorna o QSettings com o perfil salvo do usuário.
+    """
+    return QSettings(SETTINGS_ORGANIZATION, SETTINGS_APPLICATION)
+
+
+def parse_arguments(argv):
+    """
+    Lê as opções de linha de comando que sobrescrevem o perfil salvo.
+    Argumentos desconhecidos (por exemplo, opções do Qt) são ignorados.
+    """
+    parser = argparse.ArgumentParser(description="Markdown Reference Manager")
+    parser.add_argument('vault', nargs='?', help="Folder with the .md files to analyze.")
+    parser.add_argument('--language', choices=sorted(LANGUAGES), help="Interface language.")
+    parser.add_argument('--db', help="SQLite database used as the reference index (kept between runs).")
+    parser.add_argument('--ask', action='store_true',
+                        help="Show the language and folder dialogs even if a profile is saved.")
+    parser.add_argument('--reset-settings', action='store_true',
+                        help="Discard the saved profile before starting.")
+    args, _ = parser.parse_known_args(argv)
+    return args
+
+
 def main():
+    args = parse_arguments(sys.argv[1:])
     app = QApplication(sys.argv)
 
-    # Traduções temporárias para o diálogo de seleção de idioma (padrão para inglês)
-    temp_translations = LANGUAGES['english']
-
-    # Criar e exibir o diálogo de seleção de idioma
-    selection_dialog = LanguageSelectionDialog(temp_translations, None)
-    if selection_dialog.exec_() == QDialog.Accepted:
-        selected_language = selection_dialog.get_selected_language()
-    else:
-        # Se o usuário cancelar, sair do aplicativo
-        sys.exit()
+    settings = carregar_configuracoes()
+    if args.reset_settings:
+        settings.clear()
+
+    # Iniciar a varredura da pasta conhecida antes de qualquer diálogo ou widget
+    directory = args.vault or (None if args.ask else settings.value('vault/last_directory'))
+    if directory and not os.path.isdir(directory):
+        directory = None
+    scan_future = iniciar_varredura(directory, args.db) if directory else None
+
+    # Idioma: linha de comando, depois perfil salvo, depois diálogo de seleção
+    selected_language = args.language or (None if args.ask else settings.value('language'))
+    if selected_language not in LANGUAGES:
+        # Traduções temporárias para o diálogo de seleção de idioma (padrão para inglês)
+        temp_translations = LANGUAGES['english']
+
+        # Criar e exibir o diálogo de seleção de idioma
+        selection_dialog = LanguageSelectionDialog(
+            temp_translations, None, settings.value('language', 'english')
+        )
+        if selection_dialog.exec_() == QDialog.Accepted:
+            selected_language = selection_dialog.get_selected_language()
+        else:
+            # Se o usuário cancelar, sair do aplicativo
+            sys.exit()
+    settings.setValue('language', selected_language)
 
     # Obter as traduções com base no idioma selecionado
     translations = LANGUAGES.get(selected_language, LANGUAGES['english'])
 
     # Inicializar o aplicativo principal com as traduções selecionadas
-    manager = MarkdownReferenceManager(translations)
+    manager = MarkdownReferenceManager(translations, settings, directory, scan_future, args.db)
     manager.show()
     sys.exit(app.exec_())
 
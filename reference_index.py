@@ -0,0 +1,656 @@
+"""
+Índice de referências [[ ]] e edição dos arquivos Markdown, sem dependência de Qt.
+
+Pode ser usado pela interface gráfica ou diretamente pela linha de comando:
+    python reference_index.py /pasta/com/arquivos --db referencias.sqlite
+"""
+import os
+import re
+import unicodedata
+import shutil
+import sqlite3
+import tempfile
+import argparse
+from collections import defaultdict
+from itertools import groupby
+from operator import itemgetter
+
+
+def remover_acentos(texto):
+    """
+    Remove acentos de uma string e normaliza para minúsculas.
+    """
+    nfkd = unicodedata.normalize('NFKD', texto)
+    return ''.join([c for c in nfkd if not unicodedata.combining(c)]).lower().strip()
+
+
+def extrair_referencias(linha):
+    """
+    Extrai todas as referências dentro de colchetes duplos em uma linha.
+    Retorna uma lista de tuplas (exact_ref, normalized_ref).
+    """
+    matches = re.findall(r'\[\[(.*?)\]\]', linha)
+    referencias = []
+    for match in matches:
+        exact_ref = match.strip()
+        normalized_ref = remover_acentos(match)
+        if exact_ref:
+            referencias.append((exact_ref, normalized_ref))
+    return referencias
+
+
+def agrupar_por_palavras_comuns(referencias):
+    """
+    Agrupa referências por palavras em comum, sem ignorar stopwords.
+    :param referencias: Dicionário {arquivo: [(linha, exact_text)]}.
+    :return: Dicionário {palavra_comum: [(arquivo, linha, exact_text)]}.
+    """
+    grupos = defaultdict(list)
+
+    for arquivo, ocorrencias in referencias.items():
+        for linha, exact_text in ocorrencias:
+            # Extrair todas as palavras (incluindo stopwords)
+            palavras = set(remover_acentos(exact_text).split())
+            for palavra in palavras:
+                grupos[palavra].append((arquivo, linha, exact_text))
+
+    # Filtrar grupos com textos distintos
+    grupos_filtrados = {
+        palavra: lista
+        for palavra, lista in grupos.items()
+        if len({oc[2] for oc in lista}) > 1  # Verifica se há textos diferentes
+    }
+
+    return grupos_filtrados
+
+
+def agregar_textos(ocorrencias):
+    """
+    Agrupa as ocorrências de uma palavra comum por texto exato.
+    :param ocorrencias: Lista [(arquivo, linha, exact_text)].
+    :return: Lista [(exact_text, [(arquivo, linha, exact_text)], num_arquivos)],
+             ordenada por número de ocorrências (decrescente).
+    """
+    por_texto = defaultdict(list)
+    for oc in ocorrencias:
+        por_texto[oc[2]].append(oc)
+
+    agregados = [
+        (exact_text, lista, len({oc[0] for oc in lista}))
+        for exact_text, lista in por_texto.items()
+    ]
+    agregados.sort(key=lambda x: len(x[1]), reverse=True)
+    return agregados
+
+
+def listar_arquivos_md(directory):
+    """
+    Lista os arquivos .md (apenas os nomes) de um diretório.
+    """
+    return [f for f in os.listdir(directory) if f.lower().endswith('.md')]
+
+
+def ler_referencias_do_arquivo(file_path):
+    """
+    Lê um arquivo linha a linha e gera tuplas (linha, exact_text) para cada referência.
+    """
+    with open(file_path, 'r', encoding='utf-8') as f:
+        for line_num, line in enumerate(f, start=1):
+            for exact_ref, normalized_ref in extrair_referencias(line):
+                yield line_num, exact_ref
+
+
+def _paginar(lista, offset=0, limit=None):
+    return lista[offset:] if limit is None else lista[offset:offset + limit]
+
+
+class IndiceMemoria:
+    """
+    Índice mantido em dicionários Python. É o backend padrão: rápido para pastas
+    que cabem na memória, mas perdido ao fechar o aplicativo.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        self.referencias = defaultdict(list)  # {arquivo: [(linha, exact_text)]}
+        self._grupos = []                     # [(palavra_comum, [(arquivo, linha, exact_text)])]
+        self._por_palavra = {}
+
+    def indexar(self, arquivos=None):
+        """
+        Lê os arquivos .md do diretório e agrupa as referências encontradas.
+        :param arquivos: Nomes dos arquivos a reler; por padrão, a pasta inteira.
+                         Arquivos que não existem mais são retirados do índice.
+        """
+        presentes = set(listar_arquivos_md(self.directory))
+        if arquivos is None:
+            self.referencias = defaultdict(list)
+            arquivos = presentes
+        for file in list(self.referencias):
+            if file not in presentes:
+                del self.referencias[file]
+
+        for file in arquivos:
+            self.referencias.pop(file, None)
+            if file in presentes:
+                file_path = os.path.join(self.directory, file)
+                self.referencias[file] = list(ler_referencias_do_arquivo(file_path))
+
+        grupos_filtrados = agrupar_por_palavras_comuns(self.referencias)
+        self._grupos = sorted(grupos_filtrados.items(), key=lambda x: len(x[1]), reverse=True)
+        self._por_palavra = dict(self._grupos)
+
+    def contar_grupos(self):
+        return len(self._grupos)
+
+    def grupos(self, offset=0, limit=None):
+        """
+        Retorna uma página de grupos [(palavra_comum, frequencia)] por frequência decrescente.
+        """
+        return [(palavra, len(ocorrencias)) for palavra, ocorrencias in _paginar(self._grupos, offset, limit)]
+
+    def textos(self, palavra, offset=0, limit=None):
+        """
+        Retorna uma página de textos distintos do grupo [(exact_text, num_ocorrencias, num_arquivos)].
+        """
+        agregados = agregar_textos(self._por_palavra.get(palavra, []))
+        return [(exact_text, len(lista), num_arquivos)
+                for exact_text, lista, num_arquivos in _paginar(agregados, offset, limit)]
+
+    def ocorrencias(self, palavra, exact_text=None, offset=0, limit=None):
+        """
+        Retorna uma página de ocorrências [(arquivo, linha, exact_text)] do grupo,
+        opcionalmente restritas a um texto exato.
+        """
+        ocorrencias = self._por_palavra.get(palavra, [])
+        if exact_text is not None:
+            ocorrencias = [oc for oc in ocorrencias if oc[2] == exact_text]
+        return _paginar(ocorrencias, offset, limit)
+
+    def ocorrencias_do_texto(self, exact_text, offset=0, limit=None):
+        """
+        Retorna uma página de ocorrências [(arquivo, linha, exact_text)] de um texto exato,
+        em qualquer grupo.
+        """
+        ocorrencias = [
+            (arquivo, linha, texto)
+            for arquivo, lista in self.referencias.items()
+            for linha, texto in lista
+            if texto == exact_text
+        ]
+        return _paginar(ocorrencias, offset, limit)
+
+    def buscar_textos(self, termo, limit=100):
+        """
+        Retorna os textos exatos que contêm o termo (sem diferenciar acentos e maiúsculas).
+        """
+        termo = remover_acentos(termo)
+        encontrados = []
+        for exact_text in sorted({ref[1] for lista in self.referencias.values() for ref in lista}):
+            if termo in remover_acentos(exact_text):
+                encontrados.append(exact_text)
+                if len(encontrados) >= limit:
+                    break
+        return encontrados
+
+    def ocorrencias_por_arquivo(self, palavra, exact_text=None):
+        """
+        Gera (arquivo, [(arquivo, linha, exact_text)]) para as ocorrências do grupo
+        (ou de um texto exato do grupo), em ordem de nome de arquivo.
+        """
+        por_arquivo = defaultdict(list)
+        for oc in self._por_palavra.get(palavra, []):
+            if exact_text is None or oc[2] == exact_text:
+                por_arquivo[oc[0]].append(oc)
+        for arquivo in sorted(por_arquivo):
+            yield arquivo, por_arquivo[arquivo]
+
+    def fechar(self):
+        pass
+
+
+# Esquema do índice em SQLite
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS texts (id INTEGER PRIMARY KEY, exact TEXT NOT NULL UNIQUE);
+CREATE TABLE IF NOT EXISTS words (id INTEGER PRIMARY KEY, word TEXT NOT NULL UNIQUE);
+CREATE TABLE IF NOT EXISTS postings (
+    word_id INTEGER NOT NULL,
+    text_id INTEGER NOT NULL,
+    PRIMARY KEY (word_id, text_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_text ON postings (text_id);
+CREATE TABLE IF NOT EXISTS occurrences (
+    file_id INTEGER NOT NULL,
+    line INTEGER NOT NULL,
+    text_id INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS occurrences_text ON occurrences (text_id, file_id, line);
+CREATE INDEX IF NOT EXISTS occurrences_file ON occurrences (file_id);
+CREATE TABLE IF NOT EXISTS groups (word_id INTEGER PRIMARY KEY, freq INTEGER NOT NULL);
+CREATE INDEX IF NOT EXISTS groups_freq ON groups (freq DESC, word_id);
+CREATE TEMP TABLE IF NOT EXISTS affected_texts (text_id INTEGER PRIMARY KEY);
+CREATE TEMP TABLE IF NOT EXISTS affected_words (word_id INTEGER PRIMARY KEY);
+"""
+
+# Quantidade de ocorrências inseridas por lote durante a indexação
+SQLITE_BATCH_SIZE = 10000
+# Limite do cache de ids de textos mantido durante a indexação
+SQLITE_TEXT_CACHE_SIZE = 50000
+
+
+class IndiceSQLite:
+    """
+    Índice persistido em um banco SQLite local. Arquivos, ocorrências e palavras ficam
+    em tabelas indexadas e todas as consultas são paginadas em SQL, então o uso de
+    memória não cresce com a pasta. Execuções seguintes só releem arquivos alterados.
+    Se o SQLite tiver FTS5, buscar_textos usa busca de texto completo.
+    """
+    def __init__(self, directory, db_path):
+        self.directory = directory
+        self.db_path = db_path
+        # A conexão é usada por mais de uma thread, uma de cada vez: quem usa o índice
+        # não faz consultas enquanto uma indexação em segundo plano está em andamento
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SQLITE_SCHEMA)
+        self.fts = self._criar_fts()
+
+        # Um banco serve a uma única pasta; ao trocar de pasta o índice é refeito
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'directory'").fetchone()
+        directory = os.path.abspath(directory)
+        if row is None or row[0] != directory:
+            with self.conn:
+                for table in ('files', 'texts', 'words', 'postings', 'occurrences', 'groups'):
+                    self.conn.execute(f"DELETE FROM {table}")
+                if self.fts:
+                    self.conn.execute("INSERT INTO texts_fts (texts_fts) VALUES ('delete-all')")
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES ('directory', ?)", (directory,)
+                )
+
+    def _criar_fts(self):
+        try:
+            self.conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS texts_fts "
+                "USING fts5 (exact, content='texts', content_rowid='id', tokenize='unicode61 remove_diacritics 2')"
+            )
+            return True
+        except sqlite3.OperationalError:
+            # SQLite compilado sem FTS5
+            return False
+
+    def indexar(self, arquivos=None):
+        """
+        Atualiza o índice a partir dos arquivos .md do diretório.
+        :param arquivos: Nomes dos arquivos a reler; por padrão, todos os que mudaram
+                         (tamanho ou data de modificação) desde a última indexação.
+        """
+        conn = self.conn
+        presentes = set(listar_arquivos_md(self.directory))
+        with conn:
+            # Arquivos removidos da pasta
+            for file_id, path in conn.execute("SELECT id, path FROM files").fetchall():
+                if path not in presentes:
+                    self._remover_arquivo(file_id)
+
+            for file in sorted(presentes if arquivos is None else set(arquivos) & presentes):
+                stat = os.stat(os.path.join(self.directory, file))
+                row = conn.execute("SELECT id, mtime_ns, size FROM files WHERE path = ?", (file,)).fetchone()
+                if arquivos is None and row is not None and row[1:] == (stat.st_mtime_ns, stat.st_size):
+                    continue
+                if row is not None:
+                    self._remover_arquivo(row[0], manter_registro=True)
+                    conn.execute(
+                        "UPDATE files SET mtime_ns = ?, size = ? WHERE id = ?",
+                        (stat.st_mtime_ns, stat.st_size, row[0])
+                    )
+                    file_id = row[0]
+                else:
+                    file_id = conn.execute(
+                        "INSERT INTO files (path, mtime_ns, size) VALUES (?, ?, ?)",
+                        (file, stat.st_mtime_ns, stat.st_size)
+                    ).lastrowid
+                self._indexar_arquivo(file_id, os.path.join(self.directory, file))
+
+            self._recalcular_grupos()
+
+    def _remover_arquivo(self, file_id, manter_registro=False):
+        self.conn.execute(
+            "INSERT OR IGNORE INTO temp.affected_texts (text_id) "
+            "SELECT DISTINCT text_id FROM occurrences WHERE file_id = ?", (file_id,)
+        )
+        self.conn.execute("DELETE FROM occurrences WHERE file_id = ?", (file_id,))
+        if not manter_registro:
+            self.conn.execute("DELETE FROM files WHERE id = ?", (file_id,))
+
+    def _indexar_arquivo(self, file_id, file_path):
+        cache = {}
+        lote = []
+        for linha, exact_text in ler_referencias_do_arquivo(file_path):
+            text_id = cache.get(exact_text)
+            if text_id is None:
+                if len(cache) >= SQLITE_TEXT_CACHE_SIZE:
+                    cache.clear()
+                text_id = cache[exact_text] = self._id_do_texto(exact_text)
+            lote.append((file_id, linha, text_id))
+            if len(lote) >= SQLITE_BATCH_SIZE:
+                self._inserir_ocorrencias(lote)
+                lote = []
+        self._inserir_ocorrencias(lote)
+
+    def _inserir_ocorrencias(self, lote):
+        self.conn.executemany("INSERT INTO occurrences (file_id, line, text_id) VALUES (?, ?, ?)", lote)
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO temp.affected_texts (text_id) VALUES (?)",
+            ((text_id,) for _, _, text_id in lote)
+        )
+
+    def _id_do_texto(self, exact_text):
+        row = self.conn.execute("SELECT id FROM texts WHERE exact = ?", (exact_text,)).fetchone()
+        if row is not None:
+            return row[0]
+
+        text_id = self.conn.execute("INSERT INTO texts (exact) VALUES (?)", (exact_text,)).lastrowid
+        if self.fts:
+            self.conn.execute("INSERT INTO texts_fts (rowid, exact) VALUES (?, ?)", (text_id, exact_text))
+        for palavra in set(remover_acentos(exact_text).split()):
+            self.conn.execute("INSERT OR IGNORE INTO words (word) VALUES (?)", (palavra,))
+            self.conn.execute(
+                "INSERT INTO postings (word_id, text_id) SELECT id, ? FROM words WHERE word = ?",
+                (text_id, palavra)
+            )
+        return text_id
+
+    def _recalcular_grupos(self):
+        """
+        Recalcula a frequência apenas das palavras ligadas aos textos afetados
+        e remove os textos que ficaram sem ocorrências.
+        """
+        conn = self.conn
+        conn.execute(
+            "INSERT OR IGNORE INTO temp.affected_words (word_id) "
+            "SELECT DISTINCT word_id FROM postings WHERE text_id IN (SELECT text_id FROM temp.affected_texts)"
+        )
+
+        # Textos órfãos
+        orfaos = (
+            "SELECT a.text_id FROM temp.affected_texts a "
+            "WHERE NOT EXISTS (SELECT 1 FROM occurrences o WHERE o.text_id = a.text_id)"
+        )
+        if self.fts:
+            conn.execute(
+                "INSERT INTO texts_fts (texts_fts, rowid, exact) "
+                f"SELECT 'delete', id, exact FROM texts WHERE id IN ({orfaos})"
+            )
+        conn.execute(f"DELETE FROM postings WHERE text_id IN ({orfaos})")
+        conn.execute(f"DELETE FROM texts WHERE id IN ({orfaos})")
+
+        conn.execute("DELETE FROM groups WHERE word_id IN (SELECT word_id FROM temp.affected_words)")
+        # Um grupo precisa de ao menos dois textos distintos
+        conn.execute(
+            "INSERT INTO groups (word_id, freq) "
+            "SELECT p.word_id, COUNT(*) FROM postings p JOIN occurrences o ON o.text_id = p.text_id "
+            "WHERE p.word_id IN (SELECT word_id FROM temp.affected_words) "
+            "GROUP BY p.word_id HAVING COUNT(DISTINCT p.text_id) > 1"
+        )
+        conn.execute("DELETE FROM temp.affected_texts")
+        conn.execute("DELETE FROM temp.affected_words")
+
+    def contar_grupos(self):
+        return self.conn.execute("SELECT COUNT(*) FROM groups").fetchone()[0]
+
+    def grupos(self, offset=0, limit=None):
+        """
+        Retorna uma página de grupos [(palavra_comum, frequencia)] por frequência decrescente.
+        """
+        return self.conn.execute(
+            "SELECT w.word, g.freq FROM groups g JOIN words w ON w.id = g.word_id "
+            "ORDER BY g.freq DESC, g.word_id LIMIT ? OFFSET ?",
+            (-1 if limit is None else limit, offset)
+        ).fetchall()
+
+    def textos(self, palavra, offset=0, limit=None):
+        """
+        Retorna uma página de textos distintos do grupo [(exact_text, num_ocorrencias, num_arquivos)].
+        """
+        return self.conn.execute(
+            "SELECT t.exact, COUNT(*), COUNT(DISTINCT o.file_id) "
+            "FROM words w JOIN groups g ON g.word_id = w.id JOIN postings p ON p.word_id = w.id "
+            "JOIN texts t ON t.id = p.text_id JOIN occurrences o ON o.text_id = t.id "
+            "WHERE w.word = ? GROUP BY t.id ORDER BY COUNT(*) DESC, t.id LIMIT ? OFFSET ?",
+            (palavra, -1 if limit is None else limit, offset)
+        ).fetchall()
+
+    def _consultar_ocorrencias(self, palavra, exact_text, paginacao=""):
+        # Ocorrências de um grupo existente, opcionalmente restritas a um texto exato
+        sql = (
+            "SELECT f.path, o.line, t.exact FROM words w JOIN groups g ON g.word_id = w.id "
+            "JOIN postings p ON p.word_id = w.id JOIN texts t ON t.id = p.text_id "
+            "JOIN occurrences o ON o.text_id = t.id JOIN files f ON f.id = o.file_id "
+            "WHERE w.word = ?"
+        )
+        params = [palavra]
+        if exact_text is not None:
+            sql += " AND t.exact = ?"
+            params.append(exact_text)
+        return sql + " ORDER BY f.path, o.line" + paginacao, params
+
+    def ocorrencias(self, palavra, exact_text=None, offset=0, limit=None):
+        """
+        Retorna uma página de ocorrências [(arquivo, linha, exact_text)] do grupo,
+        opcionalmente restritas a um texto exato.
+        """
+        sql, params = self._consultar_ocorrencias(palavra, exact_text, " LIMIT ? OFFSET ?")
+        return self.conn.execute(sql, params + [-1 if limit is None else limit, offset]).fetchall()
+
+    def ocorrencias_por_arquivo(self, palavra, exact_text=None):
+        """
+        Gera (arquivo, [(arquivo, linha, exact_text)]) para as ocorrências do grupo
+        (ou de um texto exato do grupo), em ordem de nome de arquivo. As linhas são
+        lidas do cursor aos poucos, então só um arquivo fica em memória por vez.
+        """
+        cursor = self.conn.execute(*self._consultar_ocorrencias(palavra, exact_text))
+        for arquivo, linhas in groupby(cursor, key=itemgetter(0)):
+            yield arquivo, [tuple(linha) for linha in linhas]
+
+    def ocorrencias_do_texto(self, exact_text, offset=0, limit=None):
+        """
+        Retorna uma página de ocorrências [(arquivo, linha, exact_text)] de um texto exato,
+        em qualquer grupo.
+        """
+        return self.conn.execute(
+            "SELECT f.path, o.line, t.exact FROM texts t "
+            "JOIN occurrences o ON o.text_id = t.id JOIN files f ON f.id = o.file_id "
+            "WHERE t.exact = ? ORDER BY f.path, o.line LIMIT ? OFFSET ?",
+            (exact_text, -1 if limit is None else limit, offset)
+        ).fetchall()
+
+    def buscar_textos(self, termo, limit=100):
+        """
+        Retorna os textos exatos que contêm o termo, usando FTS5 quando disponível.
+        """
+        if self.fts:
+            # Cada palavra do termo vira um prefixo entre aspas (sem operadores do FTS5)
+            consulta = " ".join('"{}"*'.format(p.replace('"', '""')) for p in termo.split())
+            if not consulta:
+                return []
+            rows = self.conn.execute(
+                "SELECT exact FROM texts_fts WHERE texts_fts MATCH ? ORDER BY rank LIMIT ?",
+                (consulta, limit)
+            ).fetchall()
+        else:
+            rows = self.conn.execute(
+                "SELECT exact FROM texts WHERE exact LIKE ? ESCAPE '\\' ORDER BY exact LIMIT ?",
+                ('%' + re.sub(r'([%_\\])', r'\\\1', termo) + '%', limit)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def fechar(self):
+        self.conn.close()
+
+
+def abrir_indice(directory, db_path=None):
+    """
+    Cria o índice da pasta (em SQLite se db_path for informado) e o atualiza.
+    """
+    indice = IndiceSQLite(directory, db_path) if db_path else IndiceMemoria(directory)
+    indice.indexar()
+    return indice
+
+
+def atualizar_indice(indice, arquivos=None):
+    """
+    Relê os arquivos informados (ou os alterados) e retorna o próprio índice.
+    """
+    indice.indexar(arquivos)
+    return indice
+
+
+# Tamanho dos blocos copiados sem alteração durante a reescrita em fluxo
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+
+def substituir_referencia(linha, exact_text, replacement):
+    """
+    Substitui [[exact_text]] (sem diferenciar maiúsculas) por replacement em uma linha.
+    """
+    pattern = re.escape(exact_text)
+    return re.sub(r'\[\[' + pattern + r'\]\]', lambda m: replacement, linha, flags=re.IGNORECASE)
+
+
+def _copiar_metadados(src, dst):
+    """
+    Copia permissões, dono e atributos estendidos de src para dst.
+    Dono e atributos são copiados quando possível; as datas não, para que a
+    alteração continue visível pela data de modificação.
+    """
+    shutil.copymode(src, dst)
+    stat = os.stat(src)
+    try:
+        os.chown(dst, stat.st_uid, stat.st_gid)
+    except (AttributeError, OSError):
+        pass
+    if hasattr(os, 'listxattr'):
+        try:
+            nomes = os.listxattr(src)
+        except OSError:
+            nomes = []
+        for nome in nomes:
+            # Um atributo recusado (ex.: security.* sem privilégios) não impede os demais
+            try:
+                os.setxattr(dst, nome, os.getxattr(src, nome))
+            except OSError:
+                pass
+
+
+def reescrever_arquivo_em_fluxo(src, edicoes, backup_path=None):
+    """
+    Aplica as edições em um arquivo sem carregá-lo inteiro na memória.
+    O arquivo é copiado linha a linha para um temporário na mesma pasta, apenas as
+    linhas alvo são reescritas, o restante é copiado em blocos e o temporário
+    substitui o original de forma atômica. Se src for um link simbólico, o arquivo
+    de destino é reescrito e o link é mantido.
+    :param edicoes: Dicionário {linha: [(exact_text, replacement)]}.
+    :param backup_path: Se informado, recebe o conteúdo original do arquivo.
+    """
+    src = os.path.realpath(src)
+    ultima_linha = max(edicoes) if edicoes else 0
+    fd, temp_path = tempfile.mkstemp(
+        prefix='.' + os.path.basename(src) + '.', suffix='.tmp', dir=os.path.dirname(src) or '.'
+    )
+    try:
+        # newline='' preserva as quebras de linha originais
+        with open(src, 'r', encoding='utf-8', newline='') as fonte, \
+                open(fd, 'w', encoding='utf-8', newline='') as destino:
+            line_num = 0
+            while line_num < ultima_linha:
+                linha = fonte.readline()
+                if not linha:
+                    break
+                line_num += 1
+                for exact_text, replacement in edicoes.get(line_num, ()):
+                    linha = substituir_referencia(linha, exact_text, replacement)
+                destino.write(linha)
+            shutil.copyfileobj(fonte, destino, STREAM_CHUNK_SIZE)
+        _copiar_metadados(src, temp_path)
+
+        if backup_path:
+            # O original não é alterado pela troca atômica, então basta um hard link
+            if os.path.lexists(backup_path):
+                os.remove(backup_path)
+            try:
+                os.link(src, backup_path)
+            except OSError:
+                shutil.copy2(src, backup_path)
+
+        os.replace(temp_path, src)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def agrupar_edicoes_por_arquivo(ocorrencias, replacement):
+    """
+    Organiza as ocorrências para que cada arquivo seja reescrito uma única vez.
+    :param ocorrencias: Lista [(arquivo, linha, exact_text)].
+    :return: Dicionário {arquivo: {linha: [(exact_text, replacement)]}}.
+    """
+    edicoes = defaultdict(lambda: defaultdict(list))
+    for arquivo, linha, exact_text in ocorrencias:
+        if (exact_text, replacement) not in edicoes[arquivo][linha]:
+            edicoes[arquivo][linha].append((exact_text, replacement))
+    return edicoes
+
+
+def editar_ocorrencias(directory, ocorrencias, replacement, backup_dir):
+    """
+    Apaga (replacement vazio) ou substitui as ocorrências nos arquivos, reescrevendo
+    cada arquivo uma única vez e guardando o original em backup_dir.
+    :param ocorrencias: Lista [(arquivo, linha, exact_text)].
+    :return: Lista dos arquivos alterados.
+    """
+    os.makedirs(backup_dir, exist_ok=True)
+    arquivos = []
+    for arquivo, edicoes in agrupar_edicoes_por_arquivo(ocorrencias, replacement).items():
+        src = os.path.join(directory, arquivo)
+        backup_path = os.path.join(backup_dir, arquivo)
+        reescrever_arquivo_em_fluxo(src, edicoes, backup_path)
+        arquivos.append(arquivo)
+    return arquivos
+
+
+def main():
+    parser = argparse.ArgumentParser(description="List repeated [[references]] in a folder of .md files.")
+    parser.add_argument('vault', help="Folder with the .md files to analyze.")
+    parser.add_argument('--db', help="SQLite database used as the index (kept between runs).")
+    parser.add_argument('--word', help="List the occurrences of this common word instead of the groups.")
+    parser.add_argument('--text', help="With --word, only the occurrences of this exact text.")
+    parser.add_argument('--search', help="List exact texts that contain this term.")
+    parser.add_argument('--offset', type=int, default=0)
+    parser.add_argument('--limit', type=int, default=100)
+    args = parser.parse_args()
+
+    indice = abrir_indice(args.vault, args.db)
+    try:
+        if args.search:
+            linhas = [(texto,) for texto in indice.buscar_textos(args.search, args.limit)]
+        elif args.word:
+            linhas = indice.ocorrencias(args.word, args.text, args.offset, args.limit)
+        else:
+            linhas = indice.grupos(args.offset, args.limit)
+        for linha in linhas:
+            print("\t".join(str(campo) for campo in linha))
+    finally:
+        indice.fechar()
+
+
+if __name__ == '__main__':
+    main()
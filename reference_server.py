@@ -0,0 +1,421 @@
+"""
+Servidor local que mantém o índice de referências em memória (ou em SQLite) e
+responde consultas em JSON por HTTP, para integrações com editores e scripts.
+
+    python reference_server.py /pasta/com/arquivos --port 8765
+    curl "http://127.0.0.1:8765/groups?limit=10"
+
+Rotas:
+    GET  /status
+    GET  /groups?offset=&limit=
+    GET  /texts?word=&offset=&limit=
+    GET  /occurrences?word=&text=&offset=&limit=   (word ou text)
+    GET  /search?q=&limit=
+    POST /rename   {"text": "...", "new": "..."} ou {"occurrences": [[arquivo, linha, texto]], "new": "..."}
+    POST /delete   {"text": "..."} ou {"occurrences": [[arquivo, linha, texto]]}
+    POST /undo
+"""
+import os
+import json
+import time
+import shutil
+import asyncio
+import logging
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, parse_qs
+
+from reference_index import abrir_indice, editar_ocorrencias, listar_arquivos_md
+
+
+# Pasta (dentro da pasta analisada) com um backup por ação, usado pelo /undo.
+# É esvaziada a cada inicialização, pois o histórico de ações não sobrevive ao processo.
+SERVER_BACKUP_DIR = ".backup_reference_server"
+# Tamanho máximo aceito para o corpo de uma requisição
+MAX_BODY_SIZE = 16 * 1024 * 1024
+
+logger = logging.getLogger(__name__)
+
+HTTP_STATUS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    409: "Conflict",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+}
+
+
+class ErroRequisicao(Exception):
+    """
+    Erro de uso da API, respondido ao cliente com o status HTTP informado.
+    """
+    def __init__(self, status, mensagem):
+        super().__init__(mensagem)
+        self.status = status
+
+
+class ServidorReferencias:
+    """
+    Mantém o índice aquecido e atende as requisições com asyncio.
+    Todas as operações no índice e nos arquivos rodam em uma única thread auxiliar,
+    então ficam serializadas sem bloquear o loop de eventos.
+    """
+    def __init__(self, directory, db_path=None, poll_interval=1.0):
+        self.directory = os.path.abspath(directory)
+        self.db_path = db_path
+        self.poll_interval = poll_interval
+        self.index = None
+        self.action_history = []  # Histórico para o /undo
+        self._snapshot = {}       # {arquivo: (mtime_ns, tamanho)} visto pelo observador
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._next_action_id = 0
+        # Prefixo único por execução para as pastas de backup
+        self._run_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+        self._watcher = None
+
+    async def executar(self, funcao, *args):
+        """
+        Executa uma operação na thread do índice.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, funcao, *args)
+
+    async def iniciar(self):
+        """
+        Constrói o índice da pasta e inicia o observador de arquivos.
+        """
+        # Backups de execuções anteriores não podem mais ser desfeitos
+        shutil.rmtree(os.path.join(self.directory, SERVER_BACKUP_DIR), ignore_errors=True)
+        self._snapshot = await self.executar(self._ler_snapshot)
+        self.index = await self.executar(abrir_indice, self.directory, self.db_path)
+        self._watcher = asyncio.create_task(self.observar_arquivos())
+
+    async def servir(self, host='127.0.0.1', port=8765, unix_path=None):
+        """
+        Inicia o índice e atende conexões até o processo ser interrompido.
+        """
+        await self.iniciar()
+        if unix_path:
+            server = await asyncio.start_unix_server(self.atender_conexao, path=unix_path)
+        else:
+            server = await asyncio.start_server(self.atender_conexao, host, port)
+        async with server:
+            await server.serve_forever()
+
+    def fechar(self):
+        if self._watcher is not None:
+            self._watcher.cancel()
+        if self.index is not None:
+            self._executor.submit(self.index.fechar).result()
+        self._executor.shutdown()
+
+    # Observador de arquivos
+
+    def _ler_snapshot(self):
+        snapshot = {}
+        for file in listar_arquivos_md(self.directory):
+            try:
+                stat = os.stat(os.path.join(self.directory, file))
+            except FileNotFoundError:
+                continue
+            snapshot[file] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+
+    def _atualizar_snapshot(self, arquivos):
+        for file in arquivos:
+            try:
+                stat = os.stat(os.path.join(self.directory, file))
+                self._snapshot[file] = (stat.st_mtime_ns, stat.st_size)
+            except FileNotFoundError:
+                self._snapshot.pop(file, None)
+
+    def _reindexar_alterados(self):
+        snapshot = self._ler_snapshot()
+        alterados = {
+            file for file in set(snapshot) | set(self._snapshot)
+            if snapshot.get(file) != self._snapshot.get(file)
+        }
+        if alterados:
+            self.index.indexar(alterados)
+            self._snapshot = snapshot
+        return alterados
+
+    async def observar_arquivos(self):
+        """
+        Verifica periodicamente a pasta e reindexa os arquivos criados, alterados ou removidos.
+        """
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await self.executar(self._reindexar_alterados)
+            except Exception:
+                logger.exception("Error reindexing %s", self.directory)
+
+    # Protocolo HTTP
+
+    async def atender_conexao(self, reader, writer):
+        """
+        Atende uma conexão HTTP/1.1, mantendo-a aberta entre requisições (keep-alive).
+        """
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                try:
+                    method, target, version = request_line.decode('latin-1').split()
+                except ValueError:
+                    await self.responder(writer, 400, {'error': "Malformed request line."}, False)
+                    break
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                keep_alive = (
+                    headers.get('connection', '').lower() != 'close'
+                    and version.upper() == 'HTTP/1.1'
+                )
+                try:
+                    length = int(headers.get('content-length') or 0)
+                except ValueError:
+                    await self.responder(writer, 400, {'error': "Invalid Content-Length."}, False)
+                    break
+                if length > MAX_BODY_SIZE:
+                    await self.responder(writer, 413, {'error': "Request body too large."}, False)
+                    break
+                body = await reader.readexactly(length) if length else b''
+
+                status, payload = await self.tratar(method.upper(), target, body)
+                await self.responder(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def responder(self, writer, status, payload, keep_alive):
+        data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        writer.write(
+            f"HTTP/1.1 {status} {HTTP_STATUS[status]}\r\n"
+            "Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(data)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+            "\r\n".encode('latin-1') + data
+        )
+        await writer.drain()
+
+    async def tratar(self, method, target, body):
+        """
+        Direciona a requisição para a rota correspondente.
+        :return: Tupla (status_http, corpo_json).
+        """
+        url = urlsplit(target)
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        rotas = {
+            ('GET', '/status'): self.rota_status,
+            ('GET', '/groups'): self.rota_grupos,
+            ('GET', '/texts'): self.rota_textos,
+            ('GET', '/occurrences'): self.rota_ocorrencias,
+            ('GET', '/search'): self.rota_busca,
+            ('POST', '/rename'): self.rota_renomear,
+            ('POST', '/delete'): self.rota_apagar,
+            ('POST', '/undo'): self.rota_desfazer,
+        }
+        rota = rotas.get((method, url.path))
+        if rota is None:
+            if any(path == url.path for _, path in rotas):
+                return 405, {'error': f"Method {method} not allowed for {url.path}."}
+            return 404, {'error': f"Unknown route {url.path}."}
+
+        try:
+            if method == 'POST':
+                try:
+                    dados = json.loads(body.decode('utf-8')) if body else {}
+                except ValueError:
+                    raise ErroRequisicao(400, "Request body is not valid JSON.")
+                if not isinstance(dados, dict):
+                    raise ErroRequisicao(400, "Request body must be a JSON object.")
+                return 200, await rota(dados)
+            return 200, await rota(params)
+        except ErroRequisicao as e:
+            return e.status, {'error': str(e)}
+        except Exception as e:
+            return 500, {'error': str(e)}
+
+    # Rotas de consulta
+
+    def _paginacao(self, params):
+        try:
+            offset = int(params.get('offset', 0))
+            limit = int(params.get('limit', 100))
+        except ValueError:
+            raise ErroRequisicao(400, "offset and limit must be integers.")
+        if offset < 0 or limit < 0:
+            raise ErroRequisicao(400, "offset and limit must not be negative.")
+        return offset, limit
+
+    async def rota_status(self, params):
+        total = await self.executar(self.index.contar_grupos)
+        return {
+            'directory': self.directory,
+            'backend': 'sqlite' if self.db_path else 'memory',
+            'groups': total,
+            'undo_available': len(self.action_history),
+        }
+
+    async def rota_grupos(self, params):
+        offset, limit = self._paginacao(params)
+
+        def consultar():
+            return self.index.contar_grupos(), self.index.grupos(offset, limit)
+
+        total, grupos = await self.executar(consultar)
+        return {
+            'total': total,
+            'groups': [{'word': palavra, 'freq': freq} for palavra, freq in grupos],
+        }
+
+    async def rota_textos(self, params):
+        offset, limit = self._paginacao(params)
+        if 'word' not in params:
+            raise ErroRequisicao(400, "Missing parameter: word.")
+        textos = await self.executar(self.index.textos, params['word'], offset, limit)
+        return {
+            'texts': [
+                {'text': exact_text, 'occurrences': num_ocorrencias, 'files': num_arquivos}
+                for exact_text, num_ocorrencias, num_arquivos in textos
+            ],
+        }
+
+    async def rota_ocorrencias(self, params):
+        offset, limit = self._paginacao(params)
+        if 'word' in params:
+            ocorrencias = await self.executar(
+                self.index.ocorrencias, params['word'], params.get('text'), offset, limit
+            )
+        elif 'text' in params:
+            ocorrencias = await self.executar(self.index.ocorrencias_do_texto, params['text'], offset, limit)
+        else:
+            raise ErroRequisicao(400, "Missing parameter: word or text.")
+        return {'occurrences': [_ocorrencia_json(oc) for oc in ocorrencias]}
+
+    async def rota_busca(self, params):
+        _, limit = self._paginacao(params)
+        if not params.get('q'):
+            raise ErroRequisicao(400, "Missing parameter: q.")
+        return {'texts': await self.executar(self.index.buscar_textos, params['q'], limit)}
+
+    # Rotas de edição
+
+    def _ocorrencias_da_requisicao(self, dados):
+        """
+        Resolve o alvo de /rename e /delete: todas as ocorrências de "text" ou a lista "occurrences".
+        Só são aceitos arquivos .md da pasta analisada.
+        """
+        if 'occurrences' in dados:
+            try:
+                ocorrencias = [(str(a), int(linha), str(texto)) for a, linha, texto in dados['occurrences']]
+            except (TypeError, ValueError):
+                raise ErroRequisicao(400, "occurrences must be a list of [file, line, text].")
+        elif isinstance(dados.get('text'), str):
+            ocorrencias = self.index.ocorrencias_do_texto(dados['text'])
+        else:
+            raise ErroRequisicao(400, "Missing field: text or occurrences.")
+
+        presentes = set(listar_arquivos_md(self.directory))
+        for arquivo, _, _ in ocorrencias:
+            if arquivo not in presentes:
+                raise ErroRequisicao(400, f"Unknown file: {arquivo}.")
+        return ocorrencias
+
+    def _editar(self, ocorrencias, replacement):
+        # Um backup por ação, para desfazer apenas os arquivos dela
+        backup_dir = os.path.join(
+            self.directory, SERVER_BACKUP_DIR, f"{self._run_id}-{self._next_action_id}"
+        )
+        self._next_action_id += 1
+        arquivos = editar_ocorrencias(self.directory, ocorrencias, replacement, backup_dir)
+        # Reler os arquivos alterados; o observador não os verá como alterados
+        self.index.indexar(arquivos)
+        self._atualizar_snapshot(arquivos)
+        self.action_history.append({'files': arquivos, 'backup_dir': backup_dir})
+        return {'files': sorted(arquivos), 'occurrences': len(ocorrencias)}
+
+    async def rota_renomear(self, dados):
+        novo_texto = dados.get('new')
+        if not isinstance(novo_texto, str) or not novo_texto.strip():
+            raise ErroRequisicao(400, "Missing field: new.")
+        novo_texto = novo_texto.strip()
+
+        def renomear():
+            ocorrencias = self._ocorrencias_da_requisicao(dados)
+            return self._editar(ocorrencias, f'[[{novo_texto}]]')
+
+        return await self.executar(renomear)
+
+    async def rota_apagar(self, dados):
+        def apagar():
+            ocorrencias = self._ocorrencias_da_requisicao(dados)
+            return self._editar(ocorrencias, '')
+
+        return await self.executar(apagar)
+
+    async def rota_desfazer(self, dados):
+        def desfazer():
+            if not self.action_history:
+                raise ErroRequisicao(409, "No action to undo.")
+            last_action = self.action_history.pop()
+            backup_dir = last_action['backup_dir']
+            for file in last_action['files']:
+                # A edição reescreveu o destino de links simbólicos: restaurar nele, mantendo o link
+                backup = os.path.join(backup_dir, file)
+                dest = os.path.realpath(os.path.join(self.directory, file))
+                try:
+                    os.replace(backup, dest)
+                except OSError:
+                    # Destino em outro sistema de arquivos
+                    shutil.copy2(backup, dest)
+            shutil.rmtree(backup_dir, ignore_errors=True)
+            self.index.indexar(last_action['files'])
+            self._atualizar_snapshot(last_action['files'])
+            return {'files': sorted(last_action['files'])}
+
+        return await self.executar(desfazer)
+
+
+def _ocorrencia_json(ocorrencia):
+    arquivo, linha, exact_text = ocorrencia
+    return {'file': arquivo, 'line': linha, 'text': exact_text}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the [[reference]] index of a folder over a local JSON API.")
+    parser.add_argument('vault', help="Folder with the .md files to analyze.")
+    parser.add_argument('--db', help="SQLite database used as the index (kept between runs).")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix', help="Listen on this Unix socket instead of TCP.")
+    parser.add_argument('--poll-interval', type=float, default=1.0,
+                        help="Seconds between checks for changed files.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    servidor = ServidorReferencias(args.vault, args.db, args.poll_interval)
+    try:
+        asyncio.run(servidor.servir(args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.fechar()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import reference_index  # noqa: E402
+from reference_index import (  # noqa: E402
+    agrupar_edicoes_por_arquivo, editar_ocorrencias, reescrever_arquivo_em_fluxo
+)
+
+
+class ReescritaEmFluxoTest(unittest.TestCase):
+    def setUp(self):
+        self.raiz = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.raiz)
+
+    def escrever(self, nome, conteudo):
+        caminho = os.path.join(self.raiz, nome)
+        with open(caminho, 'wb') as f:
+            f.write(conteudo)
+        return caminho
+
+    def ler(self, caminho):
+        with open(caminho, 'rb') as f:
+            return f.read()
+
+    def temporarios(self):
+        return [nome for nome in os.listdir(self.raiz) if nome.endswith('.tmp')]
+
+    def test_agrupar_edicoes_por_arquivo(self):
+        edicoes = agrupar_edicoes_por_arquivo(
+            [('a.md', 2, 'Foo'), ('b.md', 1, 'Bar'), ('a.md', 2, 'Foo'), ('a.md', 2, 'Baz')], 'X'
+        )
+        self.assertEqual(
+            {arquivo: dict(linhas) for arquivo, linhas in edicoes.items()},
+            {'a.md': {2: [('Foo', 'X'), ('Baz', 'X')]}, 'b.md': {1: [('Bar', 'X')]}}
+        )
+
+    def test_only_target_lines_change(self):
+        caminho = self.escrever('a.md', b"[[Foo]] keep\n[[foo]] and [[Bar]]\n[[Foo]] tail\n")
+        reescrever_arquivo_em_fluxo(caminho, {2: [('Foo', '[[New]]')]})
+        self.assertEqual(self.ler(caminho), b"[[Foo]] keep\n[[New]] and [[Bar]]\n[[Foo]] tail\n")
+        self.assertEqual(self.temporarios(), [])
+
+    def test_crlf_and_last_line_without_newline_are_preserved(self):
+        caminho = self.escrever('a.md', b"one\r\n[[Foo]]\r\ntwo\r\n[[Foo]]")
+        reescrever_arquivo_em_fluxo(caminho, {2: [('Foo', '')], 4: [('Foo', '[[Bar]]')]})
+        self.assertEqual(self.ler(caminho), b"one\r\n\r\ntwo\r\n[[Bar]]")
+
+    def test_lines_past_end_of_file_are_ignored(self):
+        caminho = self.escrever('a.md', b"[[Foo]]")
+        reescrever_arquivo_em_fluxo(caminho, {1: [('Foo', 'x')], 9: [('Foo', 'y')]})
+        self.assertEqual(self.ler(caminho), b"x")
+
+    def test_rest_of_file_is_copied_in_chunks(self):
+        resto = b"".join(b"line %d [[Foo]]\n" % i for i in range(200))
+        caminho = self.escrever('a.md', b"[[Foo]]\n" + resto)
+        with mock.patch.object(reference_index, 'STREAM_CHUNK_SIZE', 7):
+            reescrever_arquivo_em_fluxo(caminho, {1: [('Foo', '')]})
+        self.assertEqual(self.ler(caminho), b"\n" + resto)
+
+    def test_backup_is_hard_link_to_original(self):
+        caminho = self.escrever('a.md', b"[[Foo]]\n")
+        inode = os.stat(caminho).st_ino
+        backup = os.path.join(self.raiz, 'a.md.bak')
+        reescrever_arquivo_em_fluxo(caminho, {1: [('Foo', '')]}, backup)
+        self.assertEqual(os.stat(backup).st_ino, inode)
+        self.assertNotEqual(os.stat(caminho).st_ino, inode)
+        self.assertEqual(self.ler(backup), b"[[Foo]]\n")
+        self.assertEqual(self.ler(caminho), b"\n")
+
+    def test_backup_falls_back_to_copy(self):
+        caminho = self.escrever('a.md', b"[[Foo]]\n")
+        backup = os.path.join(self.raiz, 'a.md.bak')
+        with mock.patch('os.link', side_effect=OSError):
+            reescrever_arquivo_em_fluxo(caminho, {1: [('Foo', '')]}, backup)
+        self.assertEqual(self.ler(backup), b"[[Foo]]\n")
+        self.assertEqual(self.ler(caminho), b"\n")
+
+    def test_symlink_is_kept_and_target_rewritten(self):
+        os.makedirs(os.path.join(self.raiz, 'real'))
+        alvo = self.escrever(os.path.join('real', 'a.md'), b"[[Foo]]\n")
+        link = os.path.join(self.raiz, 'a.md')
+        os.symlink(alvo, link)
+        backup = os.path.join(self.raiz, 'a.md.bak')
+
+        reescrever_arquivo_em_fluxo(link, {1: [('Foo', '[[Bar]]')]}, backup)
+
+        self.assertTrue(os.path.islink(link))
+        self.assertEqual(os.readlink(link), alvo)
+        self.assertEqual(self.ler(alvo), b"[[Bar]]\n")
+        self.assertFalse(os.path.islink(backup))
+        self.assertEqual(self.ler(backup), b"[[Foo]]\n")
+        self.assertEqual(os.listdir(os.path.join(self.raiz, 'real')), ['a.md'])
+
+    def test_mode_owner_and_xattrs_are_kept(self):
+        caminho = self.escrever('a.md', b"[[Foo]]\n")
+        os.chmod(caminho, 0o640)
+        if hasattr(os, 'geteuid') and os.geteuid() == 0:
+            os.chown(caminho, 1234, 5678)
+        try:
+            os.setxattr(caminho, 'user.first', b'1')
+            os.setxattr(caminho, 'user.second', b'2')
+        except (AttributeError, OSError):
+            self.skipTest("extended attributes are not supported here")
+
+        setxattr = os.setxattr
+
+        def recusar_primeiro(dst, nome, valor):
+            if nome == 'user.first':
+                raise PermissionError(nome)
+            setxattr(dst, nome, valor)
+
+        with mock.patch('os.setxattr', side_effect=recusar_primeiro):
+            reescrever_arquivo_em_fluxo(caminho, {1: [('Foo', '')]})
+
+        stat = os.stat(caminho)
+        self.assertEqual(stat.st_mode & 0o777, 0o640)
+        if os.geteuid() == 0:
+            self.assertEqual((stat.st_uid, stat.st_gid), (1234, 5678))
+        self.assertNotIn('user.first', os.listxattr(caminho))
+        self.assertEqual(os.getxattr(caminho, 'user.second'), b'2')
+
+    def test_failure_leaves_original_and_no_temp_file(self):
+        caminho = self.escrever('a.md', b"[[Foo]]\nrest\n")
+        with mock.patch('shutil.copyfileobj', side_effect=OSError("disk full")):
+            with self.assertRaises(OSError):
+                reescrever_arquivo_em_fluxo(caminho, {1: [('Foo', '')]})
+        self.assertEqual(self.ler(caminho), b"[[Foo]]\nrest\n")
+        self.assertEqual(self.temporarios(), [])
+
+    def test_editar_ocorrencias_rewrites_each_file_once(self):
+        self.escrever('a.md', b"[[Foo]] [[Foo]]\n[[Foo]]\n")
+        self.escrever('b.md', b"x\n[[Foo]]\n")
+        backup_dir = os.path.join(self.raiz, '.backup')
+        with mock.patch.object(
+            reference_index, 'reescrever_arquivo_em_fluxo', wraps=reescrever_arquivo_em_fluxo
+        ) as reescrever:
+            arquivos = editar_ocorrencias(
+                self.raiz, [('a.md', 1, 'Foo'), ('b.md', 2, 'Foo'), ('a.md', 2, 'Foo')], '[[Bar]]', backup_dir
+            )
+        self.assertEqual(sorted(arquivos), ['a.md', 'b.md'])
+        self.assertEqual(reescrever.call_count, 2)
+        self.assertEqual(self.ler(os.path.join(self.raiz, 'a.md')), b"[[Bar]] [[Bar]]\n[[Bar]]\n")
+        self.assertEqual(self.ler(os.path.join(self.raiz, 'b.md')), b"x\n[[Bar]]\n")
+        self.assertEqual(self.ler(os.path.join(backup_dir, 'a.md')), b"[[Foo]] [[Foo]]\n[[Foo]]\n")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,247 @@
+import os
+import sys
+import json
+import shutil
+import asyncio
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from reference_index import abrir_indice  # noqa: E402
+from reference_server import ServidorReferencias, SERVER_BACKUP_DIR  # noqa: E402
+
+
+VAULT = {
+    'a.md': "Notes on [[Foo Bar]] and [[Foo Baz]].\n[[Qux Zed]]\n",
+    'b.md': "[[Qux Other]]\nAgain [[Foo Bar]]\n",
+    'notes.txt': "[[Foo Bar]] in a file that is not Markdown\n",
+}
+
+
+def criar_vault(raiz):
+    vault = os.path.join(raiz, 'vault')
+    os.makedirs(vault)
+    for nome, conteudo in VAULT.items():
+        with open(os.path.join(vault, nome), 'w', encoding='utf-8') as f:
+            f.write(conteudo)
+    return vault
+
+
+async def requisitar(port, method, path, dados=None, raw_body=None):
+    """
+    Cliente HTTP mínimo: envia uma requisição e retorna (status, json).
+    """
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    body = raw_body if raw_body is not None else (b'' if dados is None else json.dumps(dados).encode('utf-8'))
+    writer.write(
+        f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n"
+        f"Content-Length: {len(body)}\r\n\r\n".encode('latin-1') + body
+    )
+    await writer.drain()
+    resposta = await reader.read()
+    writer.close()
+    cabecalho, _, corpo = resposta.partition(b'\r\n\r\n')
+    status = int(cabecalho.split()[1])
+    return status, json.loads(corpo.decode('utf-8'))
+
+
+class ServidorMemoriaTest(unittest.IsolatedAsyncioTestCase):
+    sqlite = False
+
+    async def asyncSetUp(self):
+        self.raiz = tempfile.mkdtemp()
+        self.vault = criar_vault(self.raiz)
+        db_path = os.path.join(self.raiz, 'index.sqlite') if self.sqlite else None
+        self.servidor = ServidorReferencias(self.vault, db_path, poll_interval=3600)
+        await self.servidor.iniciar()
+        self.server = await asyncio.start_server(self.servidor.atender_conexao, '127.0.0.1', 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def asyncTearDown(self):
+        self.server.close()
+        await self.server.wait_closed()
+        self.servidor.fechar()
+        shutil.rmtree(self.raiz)
+
+    def ler(self, nome):
+        with open(os.path.join(self.vault, nome), encoding='utf-8') as f:
+            return f.read()
+
+    async def test_groups(self):
+        status, dados = await requisitar(self.port, 'GET', '/groups')
+        self.assertEqual(status, 200)
+        self.assertEqual(dados['total'], 2)
+        self.assertEqual(
+            sorted((g['word'], g['freq']) for g in dados['groups']),
+            [('foo', 3), ('qux', 2)]
+        )
+
+    async def test_texts(self):
+        status, dados = await requisitar(self.port, 'GET', '/texts?word=foo')
+        self.assertEqual(status, 200)
+        self.assertEqual(
+            sorted((t['text'], t['occurrences'], t['files']) for t in dados['texts']),
+            [('Foo Bar', 2, 2), ('Foo Baz', 1, 1)]
+        )
+
+    async def test_occurrences(self):
+        status, dados = await requisitar(self.port, 'GET', '/occurrences?text=Foo%20Bar')
+        self.assertEqual(status, 200)
+        self.assertEqual(
+            sorted((o['file'], o['line']) for o in dados['occurrences']),
+            [('a.md', 1), ('b.md', 2)]
+        )
+        status, dados = await requisitar(self.port, 'GET', '/occurrences?word=qux&text=Qux%20Zed')
+        self.assertEqual(dados['occurrences'], [{'file': 'a.md', 'line': 2, 'text': 'Qux Zed'}])
+
+    async def test_rename_regroups_and_undo_restores(self):
+        status, dados = await requisitar(self.port, 'POST', '/rename', {'text': 'Foo Bar', 'new': 'Qux New'})
+        self.assertEqual(status, 200)
+        self.assertEqual(dados, {'files': ['a.md', 'b.md'], 'occurrences': 2})
+        self.assertIn('[[Qux New]]', self.ler('a.md'))
+        self.assertEqual(self.ler('notes.txt'), VAULT['notes.txt'])
+
+        # O índice deve coincidir com uma varredura nova da pasta
+        _, dados = await requisitar(self.port, 'GET', '/groups')
+        self.assertEqual([(g['word'], g['freq']) for g in dados['groups']], [('qux', 4)])
+        _, dados = await requisitar(self.port, 'GET', '/texts?word=foo')
+        self.assertEqual(dados['texts'], [])
+
+        status, dados = await requisitar(self.port, 'POST', '/undo')
+        self.assertEqual(status, 200)
+        self.assertEqual(dados, {'files': ['a.md', 'b.md']})
+        self.assertEqual(self.ler('a.md'), VAULT['a.md'])
+        self.assertEqual(self.ler('b.md'), VAULT['b.md'])
+        _, dados = await requisitar(self.port, 'GET', '/groups')
+        self.assertEqual(sorted((g['word'], g['freq']) for g in dados['groups']), [('foo', 3), ('qux', 2)])
+        self.assertEqual(os.listdir(os.path.join(self.vault, SERVER_BACKUP_DIR)), [])
+
+    async def test_undo_restores_symlink_target(self):
+        alvo = os.path.join(self.raiz, 'c.md')
+        with open(alvo, 'w', encoding='utf-8') as f:
+            f.write("[[Foo Link]]\n")
+        link = os.path.join(self.vault, 'c.md')
+        os.symlink(alvo, link)
+        await self.servidor.executar(self.servidor.index.indexar, ['c.md'])
+
+        status, _ = await requisitar(self.port, 'POST', '/rename', {'text': 'Foo Link', 'new': 'Foo Q'})
+        self.assertEqual(status, 200)
+        self.assertTrue(os.path.islink(link))
+        self.assertEqual(self.ler('c.md'), "[[Foo Q]]\n")
+
+        status, _ = await requisitar(self.port, 'POST', '/undo')
+        self.assertEqual(status, 200)
+        self.assertTrue(os.path.islink(link))
+        self.assertEqual(os.readlink(link), alvo)
+        with open(alvo, encoding='utf-8') as f:
+            self.assertEqual(f.read(), "[[Foo Link]]\n")
+        _, dados = await requisitar(self.port, 'GET', '/texts?word=foo')
+        self.assertIn('Foo Link', [t['text'] for t in dados['texts']])
+
+    async def test_delete_drops_single_text_group(self):
+        status, _ = await requisitar(self.port, 'POST', '/delete', {'occurrences': [['b.md', 1, 'Qux Other']]})
+        self.assertEqual(status, 200)
+        self.assertEqual(self.ler('b.md'), "\nAgain [[Foo Bar]]\n")
+        _, dados = await requisitar(self.port, 'GET', '/groups')
+        self.assertEqual([g['word'] for g in dados['groups']], ['foo'])
+
+    async def test_error_statuses(self):
+        casos = [
+            ('GET', '/texts', None, 400),
+            ('GET', '/groups?limit=abc', None, 400),
+            ('POST', '/rename', {'text': 'Foo Bar'}, 400),
+            ('GET', '/nope', None, 404),
+            ('POST', '/groups', {}, 405),
+            ('GET', '/undo', None, 405),
+            ('POST', '/undo', {}, 409),
+        ]
+        for method, path, dados, esperado in casos:
+            with self.subTest(method=method, path=path):
+                status, resposta = await requisitar(self.port, method, path, dados)
+                self.assertEqual(status, esperado)
+                self.assertIn('error', resposta)
+
+        status, _ = await requisitar(self.port, 'POST', '/delete', raw_body=b'{not json')
+        self.assertEqual(status, 400)
+
+    async def test_only_markdown_files_inside_vault_are_edited(self):
+        fora = os.path.join(self.raiz, 'outside.md')
+        with open(fora, 'w', encoding='utf-8') as f:
+            f.write("[[Foo Bar]]\n")
+
+        for arquivo in ('../outside.md', fora, 'notes.txt', 'missing.md'):
+            with self.subTest(arquivo=arquivo):
+                status, _ = await requisitar(
+                    self.port, 'POST', '/delete', {'occurrences': [[arquivo, 1, 'Foo Bar']]}
+                )
+                self.assertEqual(status, 400)
+
+        with open(fora, encoding='utf-8') as f:
+            self.assertEqual(f.read(), "[[Foo Bar]]\n")
+        self.assertEqual(self.ler('notes.txt'), VAULT['notes.txt'])
+
+    async def test_watcher_reindexes_changed_files(self):
+        with open(os.path.join(self.vault, 'c.md'), 'w', encoding='utf-8') as f:
+            f.write("[[Foo New]]\n")
+        await self.servidor.executar(self.servidor._reindexar_alterados)
+        _, dados = await requisitar(self.port, 'GET', '/texts?word=foo')
+        self.assertIn('Foo New', [t['text'] for t in dados['texts']])
+
+    async def test_startup_clears_old_backups(self):
+        antigo = os.path.join(self.vault, SERVER_BACKUP_DIR, 'old-run-0')
+        os.makedirs(antigo)
+        outro = ServidorReferencias(self.vault, poll_interval=3600)
+        await outro.iniciar()
+        try:
+            self.assertFalse(os.path.exists(antigo))
+        finally:
+            outro.fechar()
+
+
+class ServidorSQLiteTest(ServidorMemoriaTest):
+    sqlite = True
+
+
+class BackendsEquivalentesTest(unittest.TestCase):
+    """
+    Os backends em memória e SQLite devem coincidir com uma varredura nova após edições.
+    """
+    def setUp(self):
+        self.raiz = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.raiz)
+
+    def estado(self, indice):
+        grupos = sorted(indice.grupos())
+        return grupos, {palavra: sorted(indice.textos(palavra)) for palavra, _ in grupos}
+
+    def test_memory_and_sqlite_match_after_edits(self):
+        estados = []
+        for backend in ('memoria', 'sqlite'):
+            vault = criar_vault(os.path.join(self.raiz, backend))
+            db_path = os.path.join(self.raiz, backend, 'index.sqlite') if backend == 'sqlite' else None
+
+            async def editar():
+                servidor = ServidorReferencias(vault, db_path, poll_interval=3600)
+                await servidor.iniciar()
+                try:
+                    await servidor.rota_renomear({'text': 'Foo Bar', 'new': 'Qux New'})
+                    await servidor.rota_apagar({'occurrences': [['a.md', 2, 'Qux Zed']]})
+                    os.remove(os.path.join(vault, 'b.md'))
+                    await servidor.executar(servidor._reindexar_alterados)
+                    return await servidor.executar(self.estado, servidor.index)
+                finally:
+                    servidor.fechar()
+
+            estado = asyncio.run(editar())
+            novo = abrir_indice(vault)
+            self.assertEqual(estado, self.estado(novo))
+            estados.append(estado)
+
+        self.assertEqual(estados[0], estados[1])
+
+
+if __name__ == '__main__':
+    unittest.main()